@@ -33,6 +33,8 @@
 
           nativeCheckInputs = with pp; [
             freezegun
+            ijson
+            orjson
             pytest
             pytest-cov
           ];
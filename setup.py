@@ -30,8 +30,14 @@ setup(
         "zodbpickle>=2",
     ],
     extras_require={
+        "speedups": [
+            "ijson",
+            "orjson",
+        ],
         "test": [
             "freezegun>0.3",
+            "ijson",
+            "orjson",
             "pytest>=3.2",
             "pytest-cov>=2.7",
             "setuptools_scm>=1.15",
@@ -1,19 +1,118 @@
+import functools
 import json
 import logging
 import os.path as p
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from .derivation import Derive, SkipDrv, load
-from .utils import call
+from .utils import call, call_iter
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 _log = logging.getLogger(__name__)
 
 
+def _manifest_elements(f):
+    """Yield profile elements from an open manifest.json.
+
+    nix profile elements in manifest.json can be in two different
+    formats: https://github.com/NixOS/nix/pull/9656
+
+    If ijson is available, elements are streamed one at a time so that
+    large manifests are never materialized as a whole; otherwise the
+    whole manifest is parsed with the stdlib json module.
+    """
+    if ijson is not None:
+        # peek at the first event below "elements" to detect the format
+        kind = None
+        for prefix, event, _value in ijson.parse(f):
+            if prefix == "elements":
+                kind = event
+                break
+        f.seek(0)
+        if kind == "start_map":
+            for _name, element in ijson.kvitems(f, "elements"):
+                yield element
+        else:
+            yield from ijson.items(f, "elements.item")
+        return
+    elements = json.load(f)["elements"]
+    yield from elements.values() if isinstance(elements, dict) else elements
+
+
+def _load_drv(path):
+    try:
+        return load(path)
+    except SkipDrv:
+        return None
+
+
+# batches at least this large are parsed in worker processes; below
+# that, forking and pickling cost more than the parse itself
+PROCESS_POOL_MIN = 256
+
+
+def _load_drvs_bulk(paths):
+    """Load many .drv files through a worker pool.
+
+    Parsing a large closure one file at a time is dominated by per-file
+    open/read latency and serializes the CPU-bound parse. Large batches
+    go to a process pool, which sidesteps the GIL for the parsing;
+    small ones use threads, which start up much faster. Order of
+    results does not matter since they end up in a set.
+    """
+    if len(paths) >= PROCESS_POOL_MIN:
+        pool = ProcessPoolExecutor()
+        chunksize = 16
+    else:
+        pool = ThreadPoolExecutor()
+        chunksize = 1
+    with pool:
+        return [
+            drv
+            for drv in pool.map(_load_drv, paths, chunksize=chunksize)
+            if drv is not None
+        ]
+
+
+@functools.lru_cache(maxsize=None)
+def _exists(path):
+    """os.path.exists with memoization.
+
+    Store paths are immutable once created, and the same derivers
+    (stdenv, glibc, ...) show up hundreds of times in a closure; the
+    cache turns the repeated stat() calls into dict lookups.
+    """
+    return p.exists(path)
+
+
+@functools.lru_cache(maxsize=1)
+def _experimental_flag_needed():
+    """Check if `nix` needs --experimental-features to accept subcommands.
+
+    The probe costs a full child process, so the result is cached for
+    the lifetime of the process and shared between Store instances.
+    """
+    return "--experimental-features" in call(["nix", "--help"])
+
+
 class Store:
     def __init__(self, requisites=True, closure=False):
         self.requisites = requisites
         self.closure = closure
         self.derivations = set()
-        self.experimental_flag_needed = None
+        self._pending_drvs = []
+        self._seen_paths = set()
+        self._deriver_cache = {}
+        self._show_drv_cache = {}
 
     def add_gc_roots(self):
         """Add derivations found for all live GC roots.
@@ -21,46 +120,37 @@ class Store:
         Note that this usually includes old system versions.
         """
         _log.debug("Loading all live derivations")
-        for d in call(["nix-store", "--gc", "--print-live"]).splitlines():
+        for d in call_iter(["nix-store", "--gc", "--print-live"]):
             self.update(d)
+        self._flush_pending()
 
     def add_profile(self, profile):
         """Add derivations found in this nix profile."""
         json_manifest_path = p.join(profile, "manifest.json")
         if p.exists(json_manifest_path):
             _log.debug("Loading derivations from %s", json_manifest_path)
-            with open(json_manifest_path, "r", encoding="utf-8") as f:
-                json_manifest = json.load(f)
-            elements = json_manifest["elements"]
-            # nix profile elements in manifest.json can be in two
-            # different formats: https://github.com/NixOS/nix/pull/9656
-            if isinstance(elements, dict):
-                for name in elements:
-                    element = elements[name]
-                    if not element["active"]:
-                        continue
-                    for path in element["storePaths"]:
-                        self.add_path(path)
-            if isinstance(elements, list):
-                for element in elements:
+            paths = []
+            # binary mode: ijson expects a bytes reader and json.load
+            # detects the encoding itself
+            with open(json_manifest_path, "rb") as f:
+                for element in _manifest_elements(f):
                     if not element["active"]:
                         continue
-                    for path in element["storePaths"]:
-                        self.add_path(path)
+                    paths.extend(element["storePaths"])
+            self.add_paths(paths)
         else:
             _log.debug("Loading derivations from user profile %s", profile)
-            for line in call(
-                ["nix-env", "-q", "--out-path", "--profile", profile]
-            ).splitlines():
-                self.add_path(line.split()[1])
-
-    def _call_nix(self, args):
-        if self.experimental_flag_needed is None:
-            self.experimental_flag_needed = "--experimental-features" in call(
-                ["nix", "--help"]
+            self.add_paths(
+                [
+                    line.split()[1]
+                    for line in call_iter(
+                        ["nix-env", "-q", "--out-path", "--profile", profile]
+                    )
+                ]
             )
 
-        if self.experimental_flag_needed:
+    def _call_nix(self, args):
+        if _experimental_flag_needed():
             return call(["nix", "--experimental-features", "nix-command flakes"] + args)
         return call(["nix"] + args)
 
@@ -69,18 +159,21 @@ class Store:
             return None
         if path.endswith(".drv"):
             return path
+        cached = self._deriver_cache.get(path)
+        if cached is not None:
+            return cached
         # Deriver from QueryPathInfo
         if qpi_deriver == "undef":
             qpi_deriver = call(["nix-store", "-qd", path]).strip()
         _log.debug("qpi_deriver: %s", qpi_deriver)
-        if qpi_deriver and qpi_deriver != "unknown-deriver" and p.exists(qpi_deriver):
+        if qpi_deriver and qpi_deriver != "unknown-deriver" and _exists(qpi_deriver):
+            self._deriver_cache[path] = qpi_deriver
             return qpi_deriver
         # Deriver from QueryValidDerivers
-        qvd_deriver = list(
-            json.loads(self._call_nix(["show-derivation", path])).keys()
-        )[0]
+        qvd_deriver = list(self._show_derivations([path]).keys())[0]
         _log.debug("qvd_deriver: %s", qvd_deriver)
-        if qvd_deriver and p.exists(qvd_deriver):
+        if qvd_deriver and _exists(qvd_deriver):
+            self._deriver_cache[path] = qvd_deriver
             return qvd_deriver
 
         error = ""
@@ -94,65 +187,156 @@ class Store:
             "Cannot determine deriver. Is this really a path into the nix store?", path
         )
 
-    def _find_outputs(self, path):
-        if not path.endswith(".drv"):
-            return [path]
+    # keep bulk nix command lines well below ARG_MAX
+    ARGV_BATCH = 256
 
-        result = []
-        for drv in json.loads(self._call_nix(["show-derivation", path])).values():
-            for output in drv.get("outputs").values():
-                result.append(output.get("path"))
+    @classmethod
+    def _batched(cls, seq):
+        """Yield slices of `seq` small enough for one command line."""
+        for i in range(0, len(seq), cls.ARGV_BATCH):
+            yield seq[i : i + cls.ARGV_BATCH]
+
+    def _show_derivations(self, paths):
+        """Run `nix show-derivation` over many paths with few processes.
+
+        Nix accepts multiple paths per invocation and returns one JSON
+        dict keyed by .drv path, so a single child process serves many
+        lookups. Parsed results are cached per path, so deriver and
+        output lookups of the same path share one invocation and one
+        JSON parse. Returns the merged dict over all batches.
+        """
+        merged = {}
+        missing = []
+        for path in paths:
+            cached = self._show_drv_cache.get(path)
+            if cached is not None:
+                merged.update(cached)
+            else:
+                missing.append(path)
+        for batch in self._batched(missing):
+            data = json.loads(self._call_nix(["show-derivation"] + batch))
+            merged.update(data)
+            for drv_path, drv in data.items():
+                self._show_drv_cache[drv_path] = {drv_path: drv}
+            if len(batch) == 1:
+                # also remember the answer under the path as queried,
+                # which for output paths differs from the .drv key
+                self._show_drv_cache[batch[0]] = data
+        return merged
+
+    def _find_outputs(self, paths):
+        """Find the output paths of many store paths at once."""
+        result = [path for path in paths if not path.endswith(".drv")]
+        drvs = [path for path in paths if path.endswith(".drv")]
+        if drvs:
+            for drv in self._show_derivations(drvs).values():
+                for output in drv.get("outputs").values():
+                    result.append(output.get("path"))
         return result
 
+    def _find_derivers_bulk(self, paths):
+        """Find the derivers of many store paths with one child process.
+
+        `nix-store -qd` accepts multiple arguments and prints one
+        deriver per line in argument order, so a single invocation
+        serves all paths. Returns a dict mapping each path to its
+        deriver.
+        """
+        unresolved = [
+            path
+            for path in paths
+            if path and not path.endswith(".drv") and path not in self._deriver_cache
+        ]
+        lines = []
+        for batch in self._batched(unresolved):
+            lines.extend(call(["nix-store", "-qd"] + batch).splitlines())
+        qpi_derivers = dict(zip(unresolved, (line.strip() for line in lines)))
+        return {
+            path: self._find_deriver(path, qpi_deriver=qpi_derivers.get(path, "undef"))
+            for path in paths
+        }
+
+    def _add_closure(self, outputs):
+        """Add derivers of everything in the closure of the given outputs."""
+        for batch in self._batched(outputs):
+            data = json.loads(self._call_nix(["path-info", "-r", "--json"] + batch))
+            if not data:
+                continue
+            # 'nix path-info -r --json' can return two different json
+            # output format: https://github.com/NixOS/nix/pull/9242
+            if isinstance(data, dict):
+                entries = [
+                    (outpath, info.get("deriver")) for outpath, info in data.items()
+                ]
+            elif isinstance(data, list):
+                entries = [(info.get("path"), info.get("deriver")) for info in data]
+            else:
+                _log.warning("path-info for %s returned unexpected json", batch)
+                continue
+            for outpath, drv in entries:
+                self.update(self._find_deriver(outpath, qpi_deriver=drv))
+
     def add_path(self, path):
-        # pylint: disable=too-many-branches
         """Add the closure of all derivations referenced by a store path."""
-        if not p.exists(path):
-            raise RuntimeError(
-                f"path `{path}` does not exist - cannot load "
-                "derivations referenced from it"
-            )
-        _log.debug('Loading derivations referenced by "%s"', path)
+        self.add_paths([path])
+
+    def add_paths(self, paths):
+        """Add the closure of all derivations referenced by store paths.
+
+        Paths are resolved in bulk so that each nix-store/nix child
+        process serves many paths at once.
+        """
+        for path in paths:
+            if not _exists(path):
+                raise RuntimeError(
+                    f"path `{path}` does not exist - cannot load "
+                    "derivations referenced from it"
+                )
+            _log.debug('Loading derivations referenced by "%s"', path)
 
         if self.closure:
-            for output in self._find_outputs(path):
-                data = json.loads(self._call_nix(["path-info", "-r", "--json", output]))
-                if not data:
-                    continue
-                # 'nix path-info -r --json' can return two different json
-                # output format: https://github.com/NixOS/nix/pull/9242
-                if isinstance(data, dict):
-                    for outpath, info in data.items():
-                        drv = info.get("deriver")
-                        candidate = self._find_deriver(outpath, qpi_deriver=drv)
-                        self.update(candidate)
-                elif isinstance(data, list):
-                    for info in data:
-                        outpath = info.get("path")
-                        drv = info.get("deriver")
-                        candidate = self._find_deriver(outpath, qpi_deriver=drv)
-                        self.update(candidate)
-                else:
-                    _log.warning("path-info for '%s' returned unexpected json", output)
+            outputs = self._find_outputs(paths)
+            if outputs:
+                self._add_closure(outputs)
         else:
-            deriver = self._find_deriver(path)
+            derivers = self._find_derivers_bulk(paths)
             if self.requisites:
-                for candidate in call(["nix-store", "-qR", deriver]).splitlines():
-                    self.update(candidate)
+                requested = [d for d in derivers.values() if d]
+                for batch in self._batched(requested):
+                    for candidate in call_iter(["nix-store", "-qR"] + batch):
+                        self.update(candidate)
             else:
-                self.update(deriver)
+                for deriver in derivers.values():
+                    self.update(deriver)
+        self._flush_pending()
 
     def update(self, drv_path):
+        """Schedule a .drv file for loading on the next flush.
+
+        A .drv referenced by many reverse dependencies is scheduled
+        only once; parsing it repeatedly would just be thrown away at
+        set insertion anyway.
+        """
         if not drv_path or not drv_path.endswith(".drv"):
             return
-        try:
-            drv_obj = load(drv_path)
-        except SkipDrv:
+        if drv_path in self._seen_paths:
             return
-        self.derivations.add(drv_obj)
+        self._seen_paths.add(drv_path)
+        self._pending_drvs.append(drv_path)
+
+    def _flush_pending(self):
+        """Load all scheduled .drv files in one bulk operation."""
+        if not self._pending_drvs:
+            return
+        self.derivations.update(_load_drvs_bulk(self._pending_drvs))
+        self._pending_drvs = []
 
     def load_pkgs_json(self, json_fobj):
-        for pkg in json.load(json_fobj).values():
+        if orjson is not None:
+            pkgs = orjson.loads(json_fobj.read())
+        else:
+            pkgs = json.load(json_fobj)
+        for pkg in pkgs.values():
             try:
                 patches = pkg["patches"]
                 if "known_vulnerabilities" in pkg:
@@ -1,12 +1,22 @@
 import functools
 import json
+from itertools import chain
 from operator import attrgetter
 
 import click
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# bound format method: parses the format spec once instead of per vuln
+_FMT_VULN = "https://nvd.nist.gov/vuln/detail/{:17} {:<8} ".format
+
 
 def fmt_vuln(v, show_description=False):
-    out = f"https://nvd.nist.gov/vuln/detail/{v.cve_id:17} {v.cvssv3 or '':<8} "
+    out = _FMT_VULN(v.cve_id, v.cvssv3 or "")
     if show_description:
         # Show the description in a different color as they can run over the
         # line length, and this makes distinguishing them from the next entry
@@ -15,11 +25,6 @@ def fmt_vuln(v, show_description=False):
     return out.rstrip()
 
 
-def vuln_sort_key(v):
-    """Sort by CVSSv3 descending and CVE_ID ascending."""
-    return (-v.cvssv3, v)
-
-
 class Filtered:
     """Derivation with whitelist filtering applied.
 
@@ -49,45 +54,76 @@ class Filtered:
             if not self.until or self.until > wl_rule.until:
                 self.until = wl_rule.until
         if wl_rule.cve:
-            for _r in wl_rule.cve:
-                mask = set(vuln for vuln in self.report if vuln.cve_id in wl_rule.cve)
-                self.report -= mask
-                self.masked |= mask
+            cves = wl_rule.cve
+            mask = {vuln for vuln in self.report if vuln.cve_id in cves}
+            self.report -= mask
+            self.masked |= mask
         else:
             self.masked |= self.report
             self.report = set()
+        # drop memoized sort results
+        self.__dict__.pop("sorted_report", None)
+        self.__dict__.pop("sorted_masked", None)
 
-    def print(self, show_masked=False, show_description=False):
+    @functools.cached_property
+    def sorted_report(self):
+        return sorted(self.report, key=attrgetter("sort_key"))
+
+    @functools.cached_property
+    def sorted_masked(self):
+        return sorted(self.masked, key=attrgetter("sort_key"))
+
+    def format(self, show_masked=False, show_description=False):
+        """Render this item as a styled string ('' if nothing to show).
+
+        Assembling the whole report in memory lets the caller emit it
+        with a single write instead of one per line.
+        """
         if not self.report and not show_masked:
-            return
+            return ""
         d = self.derivation
         wl = not self.report
 
-        click.secho(f"\n{'-' * 72}", dim=wl)
-        click.secho(f"{d.name}\n", fg="yellow", bold=True, dim=wl)
+        lines = [
+            click.style(f"\n{'-' * 72}", dim=wl),
+            click.style(f"{d.name}\n", fg="yellow", bold=True, dim=wl),
+        ]
         if d.store_path:
-            click.secho(d.store_path, fg="magenta", dim=wl)
+            lines.append(click.style(d.store_path, fg="magenta", dim=wl))
 
-        click.secho(
-            f"{'CVE':50} {'CVSSv3':<8} {'Description' if show_description else ''}".rstrip(),
-            dim=wl,
+        lines.append(
+            click.style(
+                f"{'CVE':50} {'CVSSv3':<8} "
+                f"{'Description' if show_description else ''}".rstrip(),
+                dim=wl,
+            )
         )
-        for v in sorted(self.report, key=vuln_sort_key):
-            click.echo(fmt_vuln(v, show_description))
+        for v in self.sorted_report:
+            lines.append(fmt_vuln(v, show_description))
         if show_masked:
-            for v in sorted(self.masked, key=vuln_sort_key):
-                click.secho(f"{fmt_vuln(v, show_description)}  [whitelisted]", dim=True)
-
-        issues = functools.reduce(set.union, (r.issue_url for r in self.rules), set())
+            for v in self.sorted_masked:
+                lines.append(
+                    click.style(
+                        f"{fmt_vuln(v, show_description)}  [whitelisted]", dim=True
+                    )
+                )
+
+        issues = set().union(*(r.issue_url for r in self.rules))
         if issues:
-            click.secho("\nIssue(s):", fg="cyan", dim=wl)
+            lines.append(click.style("\nIssue(s):", fg="cyan", dim=wl))
             for url in issues:
-                click.secho(url, fg="cyan", dim=wl)
+                lines.append(click.style(url, fg="cyan", dim=wl))
         for rule in self.rules:
             if rule.comment:
-                click.secho("\nComment:", fg="blue", dim=wl)
+                lines.append(click.style("\nComment:", fg="blue", dim=wl))
                 for comment in rule.comment:
-                    click.secho("* " + comment, fg="blue", dim=wl)
+                    lines.append(click.style("* " + comment, fg="blue", dim=wl))
+        return "\n".join(lines) + "\n"
+
+    def print(self, show_masked=False, show_description=False):
+        out = self.format(show_masked, show_description)
+        if out:
+            click.echo(out, nl=False)
 
 
 def output_text(vulns, show_whitelisted=False, show_description=False):
@@ -104,20 +140,33 @@ def output_text(vulns, show_whitelisted=False, show_description=False):
             click.secho("Found no advisories. Excellent!", fg="green")
         return
 
-    click.secho(f"{len(report)} derivations with active advisories", fg="red")
+    # build the whole report in memory and emit it with one write to
+    # avoid a write() syscall per line on unbuffered stdout
+    chunks = [
+        click.style(f"{len(report)} derivations with active advisories", fg="red")
+        + "\n"
+    ]
     if wl and not show_whitelisted:
-        click.secho(f"{len(wl)} derivations left out due to whitelisting", fg="blue")
+        chunks.append(
+            click.style(f"{len(wl)} derivations left out due to whitelisting", fg="blue")
+            + "\n"
+        )
 
     for i in sorted(report, key=attrgetter("derivation")):
-        i.print(show_whitelisted, show_description)
+        chunks.append(i.format(show_whitelisted, show_description))
     if show_whitelisted:
         for i in sorted(wl, key=attrgetter("derivation")):
-            i.print(show_whitelisted, show_description)
+            chunks.append(i.format(show_whitelisted, show_description))
     if wl and not show_whitelisted:
-        click.secho(
-            "\nuse --show-whitelisted to see derivations with only whitelisted CVEs",
-            fg="blue",
+        chunks.append(
+            click.style(
+                "\nuse --show-whitelisted to see derivations with only "
+                "whitelisted CVEs",
+                fg="blue",
+            )
+            + "\n"
         )
+    click.echo("".join(chunks), nl=False)
 
 
 def output_json(items, show_whitelisted=False):
@@ -126,6 +175,14 @@ def output_json(items, show_whitelisted=False):
         if not i.report and not show_whitelisted:
             continue
         d = i.derivation
+        # report and masked are disjoint, so chaining both equals their union
+        cvssv3 = {}
+        description = {}
+        for v in chain(i.report, i.masked):
+            if v.cvssv3:
+                cvssv3[v.cve_id] = v.cvssv3
+            if v.description:
+                description[v.cve_id] = v.description
         out.append(
             {
                 "name": d.name,
@@ -134,17 +191,14 @@ def output_json(items, show_whitelisted=False):
                 "derivation": d.store_path,
                 "affected_by": sorted(v.cve_id for v in i.report),
                 "whitelisted": sorted(v.cve_id for v in i.masked),
-                "cvssv3_basescore": {
-                    v.cve_id: v.cvssv3 for v in (i.report | i.masked) if v.cvssv3
-                },
-                "description": {
-                    v.cve_id: v.description
-                    for v in (i.report | i.masked)
-                    if v.description
-                },
+                "cvssv3_basescore": cvssv3,
+                "description": description,
             }
         )
-    print(json.dumps(out, indent=1))
+    if orjson is not None:
+        print(orjson.dumps(out, option=orjson.OPT_INDENT_2).decode())
+    else:
+        print(json.dumps(out, indent=1))
 
 
 def output(items, json_dump=False, show_whitelisted=False, show_description=False):
@@ -5,6 +5,7 @@ import pytest
 from click import unstyle
 from conftest import load
 
+import vulnix.output
 from vulnix.derivation import Derive
 from vulnix.output import Filtered, fmt_vuln, output, output_json, output_text
 from vulnix.vulnerability import Vulnerability
@@ -146,6 +147,15 @@ def test_output_json(wl_items, capsys):
     ]
 
 
+def test_output_json_stdlib_fallback(wl_items, capsys, monkeypatch):
+    """The stdlib fallback must produce the same document as orjson."""
+    output_json(wl_items)
+    default = capsys.readouterr().out
+    monkeypatch.setattr(vulnix.output, "orjson", None)
+    output_json(wl_items)
+    assert json.loads(capsys.readouterr().out) == json.loads(default)
+
+
 def test_exitcode(items, capsys):
     assert output([], json_dump=True) == 0
     # something to report
@@ -1,6 +1,10 @@
+import io
+import json as jsonlib
+
 import pkg_resources
 import pytest
 
+from vulnix import nix
 from vulnix.derivation import Derive
 from vulnix.nix import Store
 
@@ -20,3 +24,34 @@ def test_load_json(json):
             Derive(name="boolector-3.0.0", patches="CVE-2019-7560.patch CVE-2019-7559"),
         ]
     )
+
+
+def test_load_json_without_orjson(json, monkeypatch):
+    monkeypatch.setattr(nix, "orjson", None)
+    s = Store(requisites=False)
+    s.load_pkgs_json(json)
+    assert len(s.derivations) == 3
+
+
+MANIFEST_ELEMENTS = [
+    {"active": True, "storePaths": ["/nix/store/aaa-foo-1"]},
+    {"active": False, "storePaths": ["/nix/store/bbb-bar-2"]},
+]
+
+
+@pytest.mark.parametrize("use_ijson", [True, False])
+@pytest.mark.parametrize(
+    "elements",
+    [MANIFEST_ELEMENTS, {"foo": MANIFEST_ELEMENTS[0], "bar": MANIFEST_ELEMENTS[1]}],
+    ids=["list", "dict"],
+)
+def test_manifest_elements(elements, use_ijson, monkeypatch):
+    # pylint: disable=protected-access
+    if use_ijson and nix.ijson is None:
+        pytest.skip("ijson not installed")
+    if not use_ijson:
+        monkeypatch.setattr(nix, "ijson", None)
+    manifest = io.BytesIO(
+        jsonlib.dumps({"version": 1, "elements": elements}).encode("utf-8")
+    )
+    assert list(nix._manifest_elements(manifest)) == MANIFEST_ELEMENTS
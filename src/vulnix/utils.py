@@ -20,6 +20,25 @@ def call(cmd):
     return output.decode()
 
 
+def call_iter(cmd):
+    """Executes `cmd`, yielding stdout lines as they arrive.
+
+    Like `call`, stderr is swallowed iff the returncode is 0. Unlike
+    `call`, the output is never materialized as a whole, which keeps
+    memory flat when a command prints many lines.
+    """
+    with tempfile.TemporaryFile(prefix="stderr") as capture:
+        with subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=capture, text=True
+        ) as proc:
+            for line in proc.stdout:
+                yield line.rstrip("\n")
+        if proc.returncode:
+            capture.seek(0)
+            sys.stderr.write(capture.read().decode("ascii", errors="replace"))
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
 class Timer:
     def __init__(self, section):
         self.start = None
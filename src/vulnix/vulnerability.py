@@ -1,5 +1,6 @@
 import functools
 import re
+import sys
 
 from persistent import Persistent
 
@@ -23,7 +24,9 @@ class Vulnerability(Persistent):
 
     def __init__(self, cve_id, nodes=None, cvssv3=0.0, cvssv2=0.0, description=""):
         # pylint: disable=too-many-arguments, too-many-positional-arguments
-        self.cve_id = cve_id
+        # interned IDs make the frequent hash/equality checks during
+        # whitelist masking hit the pointer-comparison fast path
+        self.cve_id = sys.intern(cve_id)
         self.nodes = nodes or []
         self.cvssv3 = float(cvssv3)
         self.cvssv2 = float(cvssv2)
@@ -47,6 +50,22 @@ class Vulnerability(Persistent):
     def __hash__(self):
         return hash(self.cve_id)
 
+    @property
+    def sort_key(self):
+        """Sort by CVSSv3 descending, then CVE ID numerically ascending.
+
+        The key is computed once per object and kept in a volatile
+        (non-persisted) attribute, so sorting large reports does not
+        redo the split/negate work per comparison.
+        """
+        try:
+            return self._v_sort_key
+        except AttributeError:
+            # pylint: disable=attribute-defined-outside-init
+            (_, year, num) = self.cve_id.split("-")
+            self._v_sort_key = (-(self.cvssv3 or 0.0), int(year), int(num))
+            return self._v_sort_key
+
     @classmethod
     def parse(cls, item):
         """Create Vulnerability object from NVD JSON snippet."""
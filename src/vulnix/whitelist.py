@@ -80,12 +80,12 @@ class WhitelistRule:
             self.__dict__[field] = kw.pop(field, None) or "*"
         for field in ["cve", "issue_url"]:
             v = kw.pop(field, [])
-            if isinstance(v, set):
-                self.__dict__[field] = v
-            elif isinstance(v, list):
-                self.__dict__[field] = set(v)
+            # frozensets hash/intersect without defensive copies and
+            # make membership tests cheap in the masking hot path
+            if isinstance(v, (set, frozenset, list)):
+                self.__dict__[field] = frozenset(v)
             else:
-                self.__dict__[field] = set([v])
+                self.__dict__[field] = frozenset([v])
         if self.pname == "*" and not self.cve:
             raise RuntimeError("either pname or CVE must be set", kw)
         for url in self.issue_url:
@@ -132,11 +132,11 @@ class WhitelistRule:
     def update(self, other):
         if self.pname != other.pname or self.version != other.version:
             raise RuntimeError("cannot merge rules for different packages", self, other)
-        self.cve.update(other.cve)
+        self.cve |= other.cve
         if other.until:
             if not self.until or (self.until and other.until > self.until):
                 self.until = other.until
-        self.issue_url.update(other.issue_url)
+        self.issue_url |= other.issue_url
         self.comment.extend(other.comment)
 
     def covers(self, deriv, vulns=None):